@@ -4,8 +4,8 @@ Builds complete xray-core config JSON with SOCKS5 inbound and protocol-specific
 outbound, then injects sockopt.fragment, tlsSettings overrides, etc.
 """
 
-import copy
 import itertools
+from typing import Iterator
 
 PARAM_SPACE = {
     "fragment_length": ["1-1", "10-20", "50-100", "100-200", "200-400", "517-517"],
@@ -45,6 +45,19 @@ PARAM_GROUPS = {
 QUICK_PARAMS = ["fragment_length", "fragment_interval", "fragment_packets",
                 "fingerprint", "alpn"]
 
+# Constant pieces shared (read-only) by every generated config — they're
+# only ever serialized, so there's no need to reallocate them per grid point
+_LOG_SETTINGS = {"loglevel": "warning"}
+_SOCKS_INBOUND = {
+    "tag": "socks-in",
+    "listen": "127.0.0.1",
+    "protocol": "socks",
+    "settings": {
+        "auth": "noauth",
+        "udp": True,
+    },
+}
+
 
 def build_xray_json(config: dict, overrides: dict, socks_port: int) -> dict:
     """Generate a complete xray JSON config.
@@ -68,19 +81,8 @@ def build_xray_json(config: dict, overrides: dict, socks_port: int) -> dict:
         raise ValueError(f"Unsupported protocol: {protocol}")
 
     return {
-        "log": {"loglevel": "warning"},
-        "inbounds": [
-            {
-                "tag": "socks-in",
-                "port": socks_port,
-                "listen": "127.0.0.1",
-                "protocol": "socks",
-                "settings": {
-                    "auth": "noauth",
-                    "udp": True,
-                },
-            }
-        ],
+        "log": _LOG_SETTINGS,
+        "inbounds": [{**_SOCKS_INBOUND, "port": socks_port}],
         "outbounds": [outbound],
     }
 
@@ -369,30 +371,73 @@ def generate_combination_grid(
     return tests
 
 
+def _full_grid_keys(param_groups: list[str]) -> list[str]:
+    """Resolve param groups to the PARAM_SPACE keys a full grid sweeps."""
+    all_keys = []
+    for group_name in param_groups:
+        for key in PARAM_GROUPS.get(group_name, [group_name]):
+            if key in PARAM_SPACE:
+                all_keys.append(key)
+    return all_keys
+
+
+def full_grid_size(param_groups: list[str]) -> int:
+    """Number of combinations generate_full_grid will yield."""
+    size = 1
+    for key in _full_grid_keys(param_groups):
+        size *= len(PARAM_SPACE[key])
+    return size
+
+
 def generate_full_grid(
     config: dict, param_groups: list[str],
-) -> list[tuple[dict, str]]:
-    """Generate ALL combinations (cartesian product). Can be very large."""
-    all_keys = []
-    all_values = []
+) -> Iterator[tuple[dict, str]]:
+    """Yield ALL combinations (cartesian product). Can be very large.
 
-    for group_name in param_groups:
-        keys = PARAM_GROUPS.get(group_name, [group_name])
-        for key in keys:
-            if key not in PARAM_SPACE:
-                continue
-            all_keys.append(key)
-            all_values.append(PARAM_SPACE[key])
+    A generator rather than a list: the full default space is hundreds of
+    thousands of combinations, so callers should consume it lazily and hold
+    only the tests currently in flight.
+    """
+    all_keys = _full_grid_keys(param_groups)
 
     if not all_keys:
-        return [({}, "baseline")]
+        yield ({}, "baseline")
+        return
 
-    tests = []
+    all_values = [PARAM_SPACE[key] for key in all_keys]
     for combo in itertools.product(*all_values):
         overrides = dict(zip(all_keys, combo))
         desc = ", ".join(f"{k}={v}" for k, v in overrides.items())
-        tests.append((overrides, desc))
+        yield (overrides, desc)
+
+
+def generate_random_grid(
+    config: dict, param_groups: list[str], n_samples: int,
+) -> list[tuple[dict, str]]:
+    """Sample random points from the full parameter space.
+
+    Uniform random search finds near-optimal combinations with far fewer
+    tests than the exhaustive cartesian product — each test costs an xray
+    spawn plus a handshake, so cutting the test count cuts wall time
+    proportionally.
+    """
+    import random
+
+    all_keys = _full_grid_keys(param_groups)
+    if not all_keys:
+        return [({}, "baseline")]
 
+    tests: list[tuple[dict, str]] = []
+    seen: set[str] = set()
+    attempts = 0
+    while len(tests) < n_samples and attempts < n_samples * 10:
+        attempts += 1
+        overrides = {k: random.choice(PARAM_SPACE[k]) for k in all_keys}
+        desc = ", ".join(f"{k}={v}" for k, v in overrides.items())
+        if desc in seen:
+            continue
+        seen.add(desc)
+        tests.append((overrides, desc))
     return tests
 
 
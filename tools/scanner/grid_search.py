@@ -11,19 +11,57 @@ Quick search: Only fragment + fingerprint + alpn.
 """
 
 import asyncio
+import itertools
 from typing import Callable
 
+import orjson
+
 from config_generator import (
     PARAM_GROUPS,
     build_xray_json,
+    full_grid_size,
     generate_combination_grid,
     generate_full_grid,
     generate_quick_grid,
+    generate_random_grid,
     generate_smart_grid,
 )
 from tester import TestResult, run_batch, test_base_config
 
 
+def _freeze(overrides: dict) -> tuple:
+    """Hashable key for an overrides dict (alpn values are lists)."""
+    return tuple(
+        (k, tuple(v) if isinstance(v, list) else v)
+        for k, v in sorted(overrides.items())
+    )
+
+
+def _make_case_json(
+    config: dict, overrides: dict, desc: str, cache: dict[tuple, dict],
+) -> dict:
+    """Build the xray JSON for one test case, memoized per overrides.
+
+    The combination phase revisits the same override sets the sweep already
+    built, and build_xray_json rebuilds the whole vless/vmess skeleton each
+    time — so cache by frozen overrides and only shallow-copy the top level
+    for the per-case annotations.
+    """
+    key = _freeze(overrides)
+    base = cache.get(key)
+    if base is None:
+        # Serialize once up front with a sentinel inbound port of 0 — the
+        # tester patches the real port into these bytes with a single
+        # replace instead of re-serializing per test
+        base = build_xray_json(config, overrides, socks_port=0)
+        base["_json_bytes"] = orjson.dumps(base)
+        cache[key] = base
+    xj = dict(base)
+    xj["_overrides"] = overrides
+    xj["_description"] = desc
+    return xj
+
+
 async def smart_search(
     config: dict,
     param_groups: list[str],
@@ -46,14 +84,13 @@ async def smart_search(
     """
     all_results: list[TestResult] = []
     total_phases = 3
+    json_cache: dict[tuple, dict] = {}
 
     # ── Phase 1: Baseline ──────────────────────────────────────────────
     if on_phase:
         on_phase("Baseline Test", 1, total_phases)
 
-    base_json = build_xray_json(config, {}, socks_port=10808)
-    base_json["_overrides"] = {}
-    base_json["_description"] = "baseline (no changes)"
+    base_json = _make_case_json(config, {}, "baseline (no changes)", json_cache)
     base_result = await test_base_config(base_json, xray_bin, timeout)
 
     if on_result:
@@ -68,12 +105,10 @@ async def smart_search(
     # Skip baseline since we already tested it
     sweep_cases = [(o, d) for o, d in sweep_cases if o]
 
-    sweep_jsons = []
-    for overrides, desc in sweep_cases:
-        xj = build_xray_json(config, overrides, socks_port=10808)
-        xj["_overrides"] = overrides
-        xj["_description"] = desc
-        sweep_jsons.append(xj)
+    sweep_jsons = [
+        _make_case_json(config, overrides, desc, json_cache)
+        for overrides, desc in sweep_cases
+    ]
 
     sweep_results = await run_batch(
         sweep_jsons, xray_bin, concurrency, timeout, measure_speed, on_result,
@@ -98,12 +133,10 @@ async def smart_search(
 
     if len(winners) > 1:
         combo_cases = generate_combination_grid(winners, top_n=3)
-        combo_jsons = []
-        for overrides, desc in combo_cases:
-            xj = build_xray_json(config, overrides, socks_port=10808)
-            xj["_overrides"] = overrides
-            xj["_description"] = desc
-            combo_jsons.append(xj)
+        combo_jsons = [
+            _make_case_json(config, overrides, desc, json_cache)
+            for overrides, desc in combo_cases
+        ]
 
         combo_results = await run_batch(
             combo_jsons, xray_bin, concurrency, timeout, measure_speed, on_result,
@@ -122,22 +155,54 @@ async def full_search(
     measure_speed: bool = False,
     on_phase: Callable[[str, int, int], None] | None = None,
     on_result: Callable[[TestResult, int, int], None] | None = None,
+    max_tests: int = 500,
 ) -> list[TestResult]:
-    """Exhaustive grid search — ALL parameter combinations."""
-    if on_phase:
-        on_phase("Full Grid Search", 1, 1)
-
-    cases = generate_full_grid(config, param_groups)
-    jsons = []
-    for overrides, desc in cases:
-        xj = build_xray_json(config, overrides, socks_port=10808)
-        xj["_overrides"] = overrides
-        xj["_description"] = desc
-        jsons.append(xj)
-
-    return await run_batch(
-        jsons, xray_bin, concurrency, timeout, measure_speed, on_result,
-    )
+    """Exhaustive grid search — ALL parameter combinations.
+
+    When the cartesian product exceeds `max_tests`, falls back to uniform
+    random sampling of that many points — full factorial over the default
+    space is hundreds of thousands of multi-second tests, and random search
+    finds near-optimal combos at a fraction of the cost. Pass max_tests=0
+    to force the true exhaustive sweep.
+
+    The grid is consumed lazily in chunks so only a bounded number of
+    generated configs is ever held in memory.
+    """
+    total = full_grid_size(param_groups)
+    if max_tests and total > max_tests:
+        if on_phase:
+            on_phase("Random Grid Search", 1, 1)
+        sampled = generate_random_grid(config, param_groups, max_tests)
+        cases = iter(sampled)
+        total = len(sampled)
+    else:
+        if on_phase:
+            on_phase("Full Grid Search", 1, 1)
+        cases = generate_full_grid(config, param_groups)
+    chunk_size = max(concurrency * 10, 50)
+
+    all_results: list[TestResult] = []
+    done = 0
+
+    def _on_result(result: TestResult, completed: int, _chunk_total: int) -> None:
+        if on_result:
+            on_result(result, done + completed, total)
+
+    while True:
+        chunk = list(itertools.islice(cases, chunk_size))
+        if not chunk:
+            break
+        json_cache: dict[tuple, dict] = {}
+        jsons = [
+            _make_case_json(config, overrides, desc, json_cache)
+            for overrides, desc in chunk
+        ]
+        all_results.extend(await run_batch(
+            jsons, xray_bin, concurrency, timeout, measure_speed, _on_result,
+        ))
+        done += len(chunk)
+
+    return all_results
 
 
 async def quick_search(
@@ -1,5 +1,6 @@
 """Rich terminal output: live progress tables, final reports, JSON/URI export."""
 
+import heapq
 import json
 from pathlib import Path
 
@@ -12,8 +13,13 @@ from tester import TestResult
 
 console = Console()
 
+# Shared status cells — avoids re-parsing "[green]OK[/green]"-style markup
+# for every row of a large table
+_OK_TEXT = Text("OK", style="green")
+_FAIL_TEXT = Text("FAIL", style="red")
 
-def make_result_row(r: TestResult) -> list[str]:
+
+def make_result_row(r: TestResult) -> list:
     """Extract display values from a TestResult for table rows."""
     # Parse overrides for display columns
     params = r.params or {}
@@ -26,7 +32,12 @@ def make_result_row(r: TestResult) -> list[str]:
     if isinstance(alpn, list):
         alpn = ",".join(alpn)
 
-    status = "[green]OK[/green]" if r.success else f"[red]{r.error or 'FAIL'}[/red]"
+    if r.success:
+        status = _OK_TEXT
+    elif r.error:
+        status = Text(r.error, style="red")
+    else:
+        status = _FAIL_TEXT
     latency = f"{r.latency_ms}ms" if r.latency_ms >= 0 else "-"
     speed = f"{r.speed_mbps}" if r.speed_mbps >= 0 else "-"
 
@@ -47,8 +58,9 @@ def build_results_table(
     table.add_column("Latency", min_width=8, justify="right")
     table.add_column("Speed", min_width=6, justify="right")
 
-    for i, r in enumerate(results, 1):
-        row = make_result_row(r)
+    # Build all rows up front, then feed the table in one pass
+    rows = [make_result_row(r) for r in results]
+    for i, row in enumerate(rows, 1):
         table.add_row(str(i), *row)
 
     return table
@@ -56,30 +68,28 @@ def build_results_table(
 
 def show_final_report(results: list[TestResult]) -> None:
     """Display final results table and summary stats."""
-    # Sort: successful first by latency, then failed
-    working = sorted(
-        [r for r in results if r.success], key=lambda r: r.latency_ms,
+    total = len(results)
+    ok_count = sum(1 for r in results if r.success)
+    blocked = total - ok_count
+
+    # Only the top 20 are shown, so partial-sort the successes instead of
+    # fully sorting the whole result set; pad with failures if needed
+    top_n = min(20, total)
+    top = heapq.nsmallest(
+        top_n, (r for r in results if r.success), key=lambda r: r.latency_ms,
     )
-    failed = [r for r in results if not r.success]
-    sorted_results = working + failed
+    if len(top) < top_n:
+        need = top_n - len(top)
+        top += [r for r in results if not r.success][:need]
 
-    # Show top results table
-    top_n = min(20, len(sorted_results))
     if top_n > 0:
-        table = build_results_table(
-            sorted_results[:top_n],
-            title=f"Top {top_n} Results",
-        )
+        table = build_results_table(top, title=f"Top {top_n} Results")
         console.print()
         console.print(table)
 
     # Summary panel
-    total = len(results)
-    ok_count = len(working)
-    blocked = len(failed)
-
-    if working:
-        best = working[0]
+    if ok_count:
+        best = top[0]
         best_desc = best.description or "baseline"
         best_lat = f"{best.latency_ms}ms"
     else:
@@ -127,25 +137,29 @@ def show_phase(name: str, phase_num: int, total: int) -> None:
 def export_json(
     results: list[TestResult], path: str = "results.json",
 ) -> None:
-    """Export all results to JSON."""
-    data = []
-    for r in results:
-        entry = {
-            "params": r.params,
-            "description": r.description,
-            "success": r.success,
-            "latency_ms": r.latency_ms,
-            "speed_mbps": r.speed_mbps,
-            "error": r.error,
-        }
-        # Serialize non-JSON-safe values
-        for k, v in entry["params"].items():
-            if isinstance(v, bool):
-                entry["params"][k] = v
-        data.append(entry)
+    """Export all results to JSON, streaming one entry at a time.
 
+    Writes each result as its own line inside the array rather than
+    building the full list of dicts in memory first — grid runs can have
+    thousands of results.
+    """
     with open(path, "w") as f:
-        json.dump(data, f, indent=2, default=str)
+        f.write("[\n")
+        first = True
+        for r in results:
+            entry = {
+                "params": r.params,
+                "description": r.description,
+                "success": r.success,
+                "latency_ms": r.latency_ms,
+                "speed_mbps": r.speed_mbps,
+                "error": r.error,
+            }
+            if not first:
+                f.write(",\n")
+            f.write(json.dumps(entry, default=str))
+            first = False
+        f.write("\n]\n")
     console.print(f"  Full results saved to: [cyan]{path}[/cyan]")
 
 
@@ -13,6 +13,7 @@ Usage:
 
 import argparse
 import asyncio
+import heapq
 import sys
 from pathlib import Path
 
@@ -21,6 +22,20 @@ from rich.console import Console
 console = Console()
 
 
+def _install_uvloop() -> None:
+    """Use uvloop's event loop when available (optional dependency).
+
+    Everything the scanner does is socket-heavy asyncio — grid probes,
+    subprocess pipes, thousands of concurrent clean-IP connects — exactly
+    the workload where uvloop's libuv-based loop roughly doubles throughput.
+    """
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="MirageVPN Scanner — Anti-Censorship Parameter Grid Search",
@@ -60,6 +75,12 @@ def parse_args() -> argparse.Namespace:
         type=int, default=15,
         help="Per-test timeout in seconds (default: 15)",
     )
+    scan_p.add_argument(
+        "--max-tests",
+        type=int, default=500,
+        help="Cap for full mode: grids larger than this are randomly "
+             "sampled down (0 = truly exhaustive, default: 500)",
+    )
     scan_p.add_argument(
         "--speed",
         action="store_true",
@@ -91,6 +112,13 @@ def parse_args() -> argparse.Namespace:
         "--sample", type=int, default=100,
         help="IPs per subnet to test (0=all, default: 100)",
     )
+    ip_p.add_argument(
+        "--probe",
+        choices=["tls", "tcp"],
+        default="tls",
+        help="Probe type: tls = full handshake, tcp = bare connect "
+             "(~3x faster, same RTT ordering; default: tls)",
+    )
     ip_p.add_argument(
         "--output", "-o",
         default="clean_ips.txt",
@@ -153,6 +181,7 @@ async def cmd_scan(args: argparse.Namespace) -> None:
         "full": lambda: full_search(
             config, params, xray_bin, args.concurrency,
             args.timeout, args.speed, show_phase, show_progress_result,
+            max_tests=args.max_tests,
         ),
         "quick": lambda: quick_search(
             config, xray_bin, args.concurrency,
@@ -185,6 +214,7 @@ async def cmd_clean_ip(args: argparse.Namespace) -> None:
         concurrency=args.concurrency,
         sample_per_subnet=args.sample,
         on_result=on_result,
+        mode=args.probe,
     )
 
     working = [r for r in results if r.success]
@@ -194,13 +224,14 @@ async def cmd_clean_ip(args: argparse.Namespace) -> None:
     )
 
     if working:
-        # Show top 10
+        # Show top 10 — partial-select instead of sorting the full list
         from rich.table import Table
+        top = heapq.nsmallest(10, working, key=lambda r: r.latency_ms)
         table = Table(title="Top Clean IPs")
         table.add_column("#", width=4)
         table.add_column("IP", min_width=15)
         table.add_column("Latency", justify="right")
-        for i, r in enumerate(working[:10], 1):
+        for i, r in enumerate(top, 1):
             table.add_row(str(i), r.ip, f"{r.latency_ms}ms")
         console.print(table)
 
@@ -265,19 +296,22 @@ def _post_scan_menu(results, config) -> bool:
     while True:
         action = ask_post_scan()
         if action == "export_uri":
-            working = sorted(
-                [r for r in results if r.success], key=lambda r: r.latency_ms,
+            # Only the single best result is exported — no need to sort
+            winner = min(
+                (r for r in results if r.success),
+                key=lambda r: r.latency_ms,
+                default=None,
             )
-            if working:
+            if winner:
                 from uri_parser import build_uri
                 best = dict(config)
-                overrides = working[0].params or {}
+                overrides = winner.params or {}
                 if "fingerprint" in overrides:
                     best["fingerprint"] = overrides["fingerprint"]
                 if "alpn" in overrides:
                     alpn = overrides["alpn"]
                     best["alpn"] = ",".join(alpn) if isinstance(alpn, list) else alpn
-                best["name"] = f"best-{working[0].latency_ms}ms"
+                best["name"] = f"best-{winner.latency_ms}ms"
                 uri = build_uri(best)
                 console.print(f"\n  [green]{uri}[/green]\n")
             else:
@@ -315,11 +349,12 @@ async def cmd_clean_ip_wizard(options: dict) -> None:
     )
 
     if working:
+        top = heapq.nsmallest(10, working, key=lambda r: r.latency_ms)
         table = Table(title="Top Clean IPs")
         table.add_column("#", width=4)
         table.add_column("IP", min_width=15)
         table.add_column("Latency", justify="right")
-        for i, r in enumerate(working[:10], 1):
+        for i, r in enumerate(top, 1):
             table.add_row(str(i), r.ip, f"{r.latency_ms}ms")
         console.print(table)
 
@@ -329,6 +364,7 @@ async def cmd_clean_ip_wizard(options: dict) -> None:
 
 def main() -> None:
     args = parse_args()
+    _install_uvloop()
 
     if args.command == "scan":
         asyncio.run(cmd_scan(args))
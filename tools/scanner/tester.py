@@ -9,20 +9,20 @@ Each test:
 """
 
 import asyncio
-import json
+import hashlib
 import os
-import signal
 import tempfile
 import time
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Callable
+from typing import AsyncIterator, Callable
 
 import aiohttp
+import orjson
 from aiohttp_socks import ProxyConnector
 
 
-@dataclass
+@dataclass(slots=True)
 class TestResult:
     params: dict = field(default_factory=dict)
     description: str = ""
@@ -36,19 +36,236 @@ class TestResult:
 TEST_URL = "https://www.google.com/generate_204"
 # Speed test URL (1MB file from Cloudflare)
 SPEED_URL = "https://speed.cloudflare.com/__down?bytes=1048576"
+# Don't bother speed-testing configs slower than this — they're unusable
+# anyway, and each skipped test saves a 1MB transfer
+SPEED_LATENCY_GATE = 1500
 
 # Port range for parallel xray instances
 _BASE_PORT = 20000
-_port_counter = 0
-_port_lock = asyncio.Lock()
 
+# How many candidates to pack into one merged xray process
+_MERGE_CHUNK = 100
 
-async def _next_port() -> int:
-    global _port_counter
-    async with _port_lock:
-        port = _BASE_PORT + (_port_counter % 10000)
-        _port_counter += 1
-        return port
+
+async def _wait_port(port: int, deadline: float = 5.0) -> bool:
+    """Wait until a local port accepts connections (25ms poll, bounded)."""
+    end = time.monotonic() + deadline
+    while time.monotonic() < end:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            await writer.wait_closed()
+            return True
+        except OSError:
+            await asyncio.sleep(0.025)
+    return False
+
+
+def build_merged_config(tests: list[dict], base_port: int) -> dict:
+    """Merge a batch of candidate configs into one xray config.
+
+    Emits one SOCKS inbound per candidate (base_port + i) routed to that
+    candidate's outbound, so the whole batch shares a single xray process:
+    one spawn and one warmup instead of a process per test.
+    """
+    inbounds = []
+    outbounds = []
+    rules = []
+    for i, xray_json in enumerate(tests):
+        inbounds.append({
+            "tag": f"in{i}",
+            "port": base_port + i,
+            "listen": "127.0.0.1",
+            "protocol": "socks",
+            "settings": {"auth": "noauth", "udp": True},
+        })
+        outbounds.append({**xray_json["outbounds"][0], "tag": f"out{i}"})
+        rules.append({
+            "type": "field",
+            "inboundTag": [f"in{i}"],
+            "outboundTag": f"out{i}",
+        })
+
+    return {
+        "log": {"loglevel": "warning"},
+        "inbounds": inbounds,
+        "outbounds": outbounds,
+        "routing": {"rules": rules},
+    }
+
+
+# Long-lived aiohttp sessions keyed by SOCKS port. Reusing the pooled
+# connector keeps the TCP/TLS connection and DNS cache warm between the
+# latency probe and the speed fetch instead of re-handshaking per request.
+_sessions: dict[int, aiohttp.ClientSession] = {}
+
+
+def _session_for(port: int) -> aiohttp.ClientSession:
+    session = _sessions.get(port)
+    if session is None or session.closed:
+        connector = ProxyConnector.from_url(
+            f"socks5://127.0.0.1:{port}",
+            limit=4,
+            limit_per_host=4,
+            keepalive_timeout=30,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        _sessions[port] = session
+    return session
+
+
+async def _close_session(port: int) -> None:
+    session = _sessions.pop(port, None)
+    if session is not None:
+        await session.close()
+
+
+async def _close_sessions() -> None:
+    for port in list(_sessions):
+        await _close_session(port)
+
+
+def _write_config(path: str, config: dict) -> None:
+    _write_bytes(path, orjson.dumps(config))
+
+
+def _write_bytes(path: str, buf: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(buf)
+
+
+def _unlink_quiet(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+async def _socks5_probe(port: int, result: TestResult, timeout: int) -> None:
+    """Latency probe via raw SOCKS5 CONNECT plus a plain HTTP HEAD.
+
+    Skips the TLS handshake (~2 RTT) that the HTTPS probe pays per test —
+    it proves the tunnel carries traffic and measures its TTFB, but not
+    TLS-validated reachability, so the HTTPS probe stays the default.
+    """
+    host = b"www.google.com"
+    start = time.perf_counter_ns()
+
+    async def _roundtrip() -> None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            # Greeting: version 5, one method, no auth
+            writer.write(b"\x05\x01\x00")
+            await writer.drain()
+            if await reader.readexactly(2) != b"\x05\x00":
+                raise OSError("SOCKS5 auth refused")
+
+            # CONNECT host:80 by domain name
+            writer.write(
+                b"\x05\x01\x00\x03"
+                + bytes([len(host)]) + host
+                + (80).to_bytes(2, "big"),
+            )
+            await writer.drain()
+            reply = await reader.readexactly(4)
+            if reply[1] != 0:
+                raise OSError(f"SOCKS5 connect failed (code {reply[1]})")
+            # Drain the bound-address tail of the reply
+            atyp = reply[3]
+            if atyp == 1:
+                await reader.readexactly(6)
+            elif atyp == 4:
+                await reader.readexactly(18)
+            else:
+                n = (await reader.readexactly(1))[0]
+                await reader.readexactly(n + 2)
+
+            writer.write(b"HEAD / HTTP/1.0\r\nHost: " + host + b"\r\n\r\n")
+            await writer.drain()
+            if not await reader.read(1):
+                raise OSError("empty response")
+        finally:
+            writer.close()
+
+    try:
+        await asyncio.wait_for(_roundtrip(), timeout)
+        result.success = True
+        result.latency_ms = (time.perf_counter_ns() - start) // 1_000_000
+    except asyncio.TimeoutError:
+        result.error = "timeout"
+    except (OSError, asyncio.IncompleteReadError) as e:
+        result.error = str(e) or "connection failed"
+
+
+async def _probe(
+    port: int, result: TestResult, timeout: int, measure_speed: bool,
+    probe: str = "https",
+) -> None:
+    """Probe a SOCKS port: latency test plus optional speed test.
+
+    `probe="raw"` measures latency with _socks5_probe instead of the
+    HTTPS request. Fills in the success/latency/speed/error fields of
+    `result`.
+    """
+    if probe == "raw":
+        await _socks5_probe(port, result, timeout)
+        if not result.success or not measure_speed:
+            return
+
+    try:
+        session = _session_for(port)
+        if probe != "raw":
+            await _https_latency(session, result, timeout)
+            if not result.success:
+                return
+
+        # Speed test (optional, skipped for clearly-unusable latencies)
+        if measure_speed and result.latency_ms < SPEED_LATENCY_GATE:
+            try:
+                start = time.perf_counter_ns()
+                async with session.get(
+                    SPEED_URL,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                ) as resp:
+                    # Only the byte count matters — stream in chunks
+                    # instead of holding the whole 1MB body per probe
+                    nbytes = 0
+                    async for data in resp.content.iter_chunked(65536):
+                        nbytes += len(data)
+                    elapsed_ns = time.perf_counter_ns() - start
+                if elapsed_ns > 0:
+                    # bits / ns == megabits / ms, so scale bytes by 8000
+                    result.speed_mbps = round(nbytes * 8_000 / elapsed_ns, 2)
+            except Exception:
+                pass  # Speed test failure doesn't invalidate the config
+
+    except asyncio.TimeoutError:
+        result.error = "timeout"
+    except aiohttp.ClientError as e:
+        result.error = str(e)
+    except Exception as e:
+        result.error = str(e)
+
+
+async def _https_latency(
+    session: aiohttp.ClientSession, result: TestResult, timeout: int,
+) -> None:
+    """Default latency probe: HTTPS GET of the 204 endpoint."""
+    start = time.perf_counter_ns()
+    async with session.get(
+        TEST_URL, timeout=aiohttp.ClientTimeout(total=timeout),
+    ) as resp:
+        # Headers are already in and the 204 body is empty — take the
+        # TTFB timestamp, then hand the connection back without reading
+        elapsed_ns = time.perf_counter_ns() - start
+        await resp.release()
+
+    if resp.status in (200, 204):
+        result.success = True
+        result.latency_ms = elapsed_ns // 1_000_000
+    else:
+        result.error = f"HTTP {resp.status}"
 
 
 async def test_single(
@@ -56,6 +273,8 @@ async def test_single(
     xray_bin: str,
     timeout: int = 15,
     measure_speed: bool = False,
+    port: int = _BASE_PORT,
+    probe: str = "https",
 ) -> TestResult:
     """Start xray, test connectivity, measure latency, return result.
 
@@ -64,18 +283,31 @@ async def test_single(
         xray_bin: Path to xray binary
         timeout: Max seconds for the entire test
         measure_speed: Whether to also measure download speed
+        port: Local SOCKS port to bind the inbound on
+        probe: "https" for TLS-validated latency, "raw" for SOCKS5+HTTP
     """
-    port = await _next_port()
-
-    # Rewrite the inbound port in the config
-    config = json.loads(json.dumps(xray_json))
-    if config.get("inbounds"):
-        config["inbounds"][0]["port"] = port
-
-    # Write config to temp file
+    # Rewrite the inbound port in the config. Grid search attaches the
+    # pre-serialized template as _json_bytes with a sentinel inbound port
+    # of 0, so the real port is patched in with one byte-level replace —
+    # no parse/mutate/re-serialize round-trip per test.
+    raw = xray_json.get("_json_bytes")
+    if raw is not None:
+        buf = raw.replace(b'"port":0', b'"port":%d' % port, 1)
+    else:
+        # Only the inbound port is mutated, so a top-level copy with the
+        # first inbound rebuilt is enough — no deep clone needed
+        config = {k: v for k, v in xray_json.items() if not k.startswith("_")}
+        if config.get("inbounds"):
+            config["inbounds"] = [
+                {**config["inbounds"][0], "port": port},
+                *config["inbounds"][1:],
+            ]
+        buf = orjson.dumps(config)
+
+    # Write config to temp file off the event loop — synchronous disk I/O
+    # here would stall every other in-flight probe
     config_path = os.path.join(tempfile.gettempdir(), f"mirage_scan_{port}.json")
-    with open(config_path, "w") as f:
-        json.dump(config, f)
+    await asyncio.to_thread(_write_bytes, config_path, buf)
 
     proc = None
     result = TestResult(
@@ -89,88 +321,54 @@ async def test_single(
             xray_bin, "run", "-c", config_path,
             stdout=asyncio.subprocess.DEVNULL,
             stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True,
         )
 
-        # Wait for xray to start listening
-        await asyncio.sleep(1.5)
-
-        # Check if xray crashed
-        if proc.returncode is not None:
-            result.error = f"xray exited with code {proc.returncode}"
-            return result
-
-        # Test connectivity through SOCKS proxy
-        connector = ProxyConnector.from_url(f"socks5://127.0.0.1:{port}")
-        async with aiohttp.ClientSession(connector=connector) as session:
-            # Latency test
-            start = time.monotonic()
-            async with session.get(
-                TEST_URL, timeout=aiohttp.ClientTimeout(total=timeout),
-            ) as resp:
-                await resp.read()
-                elapsed = time.monotonic() - start
-
-            if resp.status in (200, 204):
-                result.success = True
-                result.latency_ms = int(elapsed * 1000)
+        # Wait for the SOCKS inbound to accept connections instead of a
+        # fixed warmup sleep — xray is typically ready in well under 100ms
+        if not await _wait_port(port, deadline=2.0):
+            if proc.returncode is not None:
+                result.error = f"xray exited with code {proc.returncode}"
             else:
-                result.error = f"HTTP {resp.status}"
-                return result
-
-            # Speed test (optional)
-            if measure_speed:
-                try:
-                    start = time.monotonic()
-                    async with session.get(
-                        SPEED_URL,
-                        timeout=aiohttp.ClientTimeout(total=timeout),
-                    ) as resp:
-                        data = await resp.read()
-                        elapsed = time.monotonic() - start
-                    if elapsed > 0:
-                        result.speed_mbps = round(
-                            (len(data) * 8) / (elapsed * 1_000_000), 2,
-                        )
-                except Exception:
-                    pass  # Speed test failure doesn't invalidate the config
+                result.error = "xray not ready"
+            return result
 
-    except asyncio.TimeoutError:
-        result.error = "timeout"
-    except aiohttp.ClientError as e:
-        result.error = str(e)
-    except Exception as e:
-        result.error = str(e)
+        await _probe(port, result, timeout, measure_speed, probe)
     finally:
-        # Kill xray process
+        await _close_session(port)
+
+        # Kill xray outright — it has no state worth a graceful shutdown,
+        # and waiting out a SIGTERM grace period just serializes teardown
         if proc and proc.returncode is None:
             try:
-                proc.terminate()
-                try:
-                    await asyncio.wait_for(proc.wait(), timeout=3)
-                except asyncio.TimeoutError:
-                    proc.kill()
-                    await proc.wait()
+                proc.kill()
+                await proc.wait()
             except ProcessLookupError:
                 pass
 
         # Clean up temp config
-        try:
-            os.unlink(config_path)
-        except OSError:
-            pass
+        await asyncio.to_thread(_unlink_quiet, config_path)
 
     return result
 
 
-async def run_batch(
+async def run_batch_iter(
     tests: list[dict],
     xray_bin: str,
     concurrency: int = 10,
     timeout: int = 15,
     measure_speed: bool = False,
-    on_result: Callable[[TestResult, int, int], None] | None = None,
-) -> list[TestResult]:
-    """Run tests with semaphore-limited concurrency.
+    probe: str = "https",
+    early_stop: int = 0,
+) -> AsyncIterator[TestResult]:
+    """Run tests through merged xray processes, yielding results as they land.
+
+    Candidates are packed _MERGE_CHUNK at a time into a single xray process
+    (one SOCKS inbound routed to one outbound per candidate), so process
+    spawn and startup warmup are paid once per chunk instead of once per
+    test. Probes are drained by `concurrency` worker tasks. Tests whose
+    effective config is identical (grids commonly emit the same config
+    under several descriptions) are probed once and fanned back out.
 
     Args:
         tests: List of xray JSON config dicts (with _overrides and _description)
@@ -178,31 +376,198 @@ async def run_batch(
         concurrency: Max parallel tests
         timeout: Per-test timeout in seconds
         measure_speed: Whether to measure download speed
-        on_result: Callback(result, completed_count, total_count) for live updates
+        probe: "https" for TLS-validated latency, "raw" for SOCKS5+HTTP
+        early_stop: Stop once this many successes are in (0 = run all)
+    """
+    # Deduplicate by effective config: hash the pre-serialized bytes (or a
+    # sorted-keys dump minus the underscore annotations) and only probe the
+    # first occurrence of each signature.
+    unique: list[dict] = []
+    dup_of: dict[int, int] = {}  # test index -> unique index, dups only
+    seen: dict[bytes, int] = {}
+    for ti, t in enumerate(tests):
+        raw = t.get("_json_bytes")
+        if raw is None:
+            raw = orjson.dumps(
+                {k: v for k, v in t.items() if not k.startswith("_")},
+                option=orjson.OPT_SORT_KEYS,
+            )
+        sig = hashlib.blake2b(raw, digest_size=16).digest()
+        ui = seen.get(sig)
+        if ui is None:
+            seen[sig] = len(unique)
+            unique.append(t)
+        else:
+            dup_of[ti] = ui
+
+    successes = 0
+
+    def _enough() -> bool:
+        return bool(early_stop) and successes >= early_stop
+
+    uresults: list[TestResult | None] = [None] * len(unique)
+    out_q: asyncio.Queue[TestResult | None] = asyncio.Queue()
+
+    async def _produce() -> None:
+        try:
+            for chunk_start in range(0, len(unique), _MERGE_CHUNK):
+                chunk = unique[chunk_start : chunk_start + _MERGE_CHUNK]
+                # Deterministic port block per chunk — no shared counter or
+                # lock; the modulo keeps huge grids inside the u16 port space
+                base_port = _BASE_PORT + (chunk_start % 40000)
+
+                def _on_done(
+                    i: int, result: TestResult, _off=chunk_start,
+                ) -> None:
+                    uresults[_off + i] = result
+                    out_q.put_nowait(result)
+
+                await _run_merged_chunk(
+                    chunk, base_port, xray_bin, concurrency, timeout,
+                    measure_speed, _on_done, probe, _enough,
+                )
+                if _enough():
+                    break
+
+            # Fan unique results back out to their duplicates, keeping each
+            # duplicate's own params/description for reporting
+            for ti, ui in dup_of.items():
+                src = uresults[ui]
+                if src is None:
+                    continue
+                t = tests[ti]
+                out_q.put_nowait(replace(
+                    src,
+                    params=t.get("_overrides", {}),
+                    description=t.get("_description", ""),
+                ))
+        finally:
+            await _close_sessions()
+            out_q.put_nowait(None)  # end-of-batch sentinel
+
+    producer = asyncio.create_task(_produce())
+    try:
+        while True:
+            result = await out_q.get()
+            if result is None:
+                break
+            successes += result.success
+            yield result
+        await producer  # surface producer exceptions
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except asyncio.CancelledError:
+                pass
+
+
+async def run_batch(
+    tests: list[dict],
+    xray_bin: str,
+    concurrency: int = 10,
+    timeout: int = 15,
+    measure_speed: bool = False,
+    on_result: Callable[[TestResult, int, int], None] | None = None,
+    probe: str = "https",
+    early_stop: int = 0,
+) -> list[TestResult]:
+    """Collecting wrapper around run_batch_iter for list-based callers.
+
+    Same arguments, plus on_result: Callback(result, completed_count,
+    total_count) invoked per completion for live updates.
     """
-    sem = asyncio.Semaphore(concurrency)
     results: list[TestResult] = []
-    completed = 0
     total = len(tests)
-    lock = asyncio.Lock()
+    async for result in run_batch_iter(
+        tests, xray_bin, concurrency, timeout, measure_speed, probe,
+        early_stop,
+    ):
+        results.append(result)
+        if on_result:
+            on_result(result, len(results), total)
+    return results
 
-    async def _run_one(xray_json: dict) -> TestResult:
-        nonlocal completed
-        async with sem:
-            result = await test_single(
-                xray_json, xray_bin, timeout, measure_speed,
-            )
-            async with lock:
-                completed += 1
-                results.append(result)
-                if on_result:
-                    on_result(result, completed, total)
-            return result
 
-    tasks = [asyncio.create_task(_run_one(t)) for t in tests]
-    await asyncio.gather(*tasks)
+async def _run_merged_chunk(
+    chunk: list[dict],
+    base_port: int,
+    xray_bin: str,
+    concurrency: int,
+    timeout: int,
+    measure_speed: bool,
+    on_done: Callable,
+    probe: str = "https",
+    stop: Callable[[], bool] | None = None,
+) -> None:
+    """Test one chunk of candidates through a single merged xray process."""
+    config = build_merged_config(chunk, base_port)
+
+    config_path = os.path.join(
+        tempfile.gettempdir(), f"mirage_scan_{base_port}.json",
+    )
+    await asyncio.to_thread(_write_config, config_path, config)
 
-    return results
+    chunk_results = [
+        TestResult(
+            params=xray_json.get("_overrides", {}),
+            description=xray_json.get("_description", ""),
+        )
+        for xray_json in chunk
+    ]
+
+    proc = None
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            xray_bin, "run", "-c", config_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+        # xray binds all inbounds before serving; once the first is
+        # reachable the whole chunk is ready — no fixed warmup sleep
+        if not await _wait_port(base_port):
+            if proc.returncode is not None:
+                error = f"xray exited with code {proc.returncode}"
+            else:
+                error = "xray not ready"
+            for i, result in enumerate(chunk_results):
+                result.error = error
+                on_done(i, result)
+            return
+
+        # Fixed-size worker pool instead of a task per candidate — only
+        # `concurrency` tasks ever exist, however large the chunk is
+        queue: asyncio.Queue[int] = asyncio.Queue()
+        for i in range(len(chunk)):
+            queue.put_nowait(i)
+
+        async def _worker() -> None:
+            while not (stop and stop()):
+                try:
+                    i = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await _probe(
+                    base_port + i, chunk_results[i], timeout, measure_speed,
+                    probe,
+                )
+                on_done(i, chunk_results[i])
+
+        n_workers = min(concurrency, len(chunk))
+        await asyncio.gather(*[_worker() for _ in range(n_workers)])
+    finally:
+        # Kill the merged xray process — no graceful-shutdown grace period
+        if proc and proc.returncode is None:
+            try:
+                proc.kill()
+                await proc.wait()
+            except ProcessLookupError:
+                pass
+
+        await asyncio.to_thread(_unlink_quiet, config_path)
 
 
 async def test_base_config(
@@ -5,14 +5,17 @@ Matches the URI formats used by the MirageVPN Android app
 """
 
 import base64
+import functools
 import json
-import re
-from urllib.parse import (
-    parse_qs,
-    quote,
-    unquote,
-    urlparse,
-)
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from urllib.parse import quote, unquote
+
+import orjson
+
+
+_SCHEMES = ("vless://", "vmess://", "trojan://", "ss://")
 
 
 def parse_uri(uri: str) -> dict | None:
@@ -21,16 +24,29 @@ def parse_uri(uri: str) -> dict | None:
     Supports: vless://, vmess://, trojan://, ss://
     Returns None if parsing fails.
     """
-    uri = uri.strip()
-    if uri.startswith("vless://"):
-        return _parse_vless(uri)
-    elif uri.startswith("vmess://"):
-        return _parse_vmess(uri)
-    elif uri.startswith("trojan://"):
-        return _parse_trojan(uri)
-    elif uri.startswith("ss://"):
-        return _parse_shadowsocks(uri)
-    return None
+    return _parse_uri_stripped(uri.strip())
+
+
+def _parse_uri_stripped(uri: str) -> dict | None:
+    """parse_uri without the strip — for callers with pre-stripped lines."""
+    items = _parse_uri_cached(uri)
+    if items is None:
+        return None
+    # Fresh dict per call — callers mutate the result (e.g. _raw_uri)
+    return dict(items)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_uri_cached(uri: str) -> tuple | None:
+    """Cached parse returning frozen items — subscription lists repeat the
+    same URIs across re-scans, and parsing is pure CPU-bound string work."""
+    # Tuple startswith scans all prefixes in one C call — cheap rejection
+    # of comment/garbage lines before any splitting
+    if not uri.startswith(_SCHEMES):
+        return None
+    scheme, _, rest = uri.partition("://")
+    parsed = _PARSERS[scheme](rest)
+    return tuple(parsed.items()) if parsed else None
 
 
 def build_uri(config: dict) -> str:
@@ -47,6 +63,7 @@ def build_uri(config: dict) -> str:
     raise ValueError(f"Unknown protocol: {protocol}")
 
 
+@functools.lru_cache(maxsize=4096)
 def config_id(uri: str) -> str:
     """Generate a stable ID for a config URI (strip fragment, base64 encode)."""
     stripped = uri.split("#")[0]
@@ -55,12 +72,24 @@ def config_id(uri: str) -> str:
 
 def parse_multi(text: str) -> list[dict]:
     """Parse multiple URIs from text (one per line). Skip empty/invalid lines."""
+    lines = [
+        line
+        for line in (raw.strip() for raw in text.strip().splitlines())
+        if line and not line.startswith("#")
+    ]
+    if len(lines) > 256:
+        # Large subscription lists: the base64/JSON decoding happens in C
+        # with the GIL released, so threads overlap it almost linearly
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            parsed_all = list(executor.map(_parse_uri_stripped, lines))
+    else:
+        # map() runs the dispatch loop in C — no per-line bytecode
+        parsed_all = map(_parse_uri_stripped, lines)
+
+    # Attach the raw URI to each successful parse; zip keeps the pairing
+    # that a bare filter(None, ...) would lose
     configs = []
-    for line in text.strip().splitlines():
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        parsed = parse_uri(line)
+    for line, parsed in zip(lines, parsed_all):
         if parsed:
             parsed["_raw_uri"] = line
             configs.append(parsed)
@@ -69,14 +98,13 @@ def parse_multi(text: str) -> list[dict]:
 
 # ── VLESS ──────────────────────────────────────────────────────────────────
 
-def _parse_vless(uri: str) -> dict | None:
+def _parse_vless(without_scheme: str) -> dict | None:
     try:
         # vless://uuid@host:port?params#name
-        without_scheme = uri[len("vless://"):]
-        fragment = ""
-        if "#" in without_scheme:
-            without_scheme, fragment = without_scheme.rsplit("#", 1)
-            fragment = unquote(fragment)
+        # partition splits and strips the fragment in one pass — no
+        # separate membership scan
+        without_scheme, _, fragment = without_scheme.partition("#")
+        fragment = _unquote(fragment) if fragment else ""
 
         user_host, _, query_str = without_scheme.partition("?")
         uuid, _, host_port = user_host.partition("@")
@@ -84,7 +112,8 @@ def _parse_vless(uri: str) -> dict | None:
         port = int(port_str)
 
         params = _parse_query(query_str)
-        security = params.get("security", "")
+        get = params.get  # hoist the bound method for the lookups below
+        security = get("security", "")
 
         base = {
             "protocol": "vless",
@@ -97,37 +126,37 @@ def _parse_vless(uri: str) -> dict | None:
         if security == "reality":
             base.update({
                 "security": "reality",
-                "sni": params.get("sni", ""),
-                "public_key": params.get("pbk", ""),
-                "short_id": params.get("sid", ""),
-                "fingerprint": params.get("fp", "chrome"),
-                "flow": params.get("flow", "xtls-rprx-vision"),
-                "transport": params.get("type", "tcp"),
+                "sni": get("sni", ""),
+                "public_key": get("pbk", ""),
+                "short_id": get("sid", ""),
+                "fingerprint": get("fp", "chrome"),
+                "flow": get("flow", "xtls-rprx-vision"),
+                "transport": get("type", "tcp"),
             })
         elif security == "tls":
             base.update({
                 "security": "tls",
-                "sni": params.get("sni", host),
-                "host": params.get("host", host),
-                "path": unquote(params.get("path", "/")),
-                "transport": params.get("type", "ws"),
-                "fingerprint": params.get("fp", ""),
-                "alpn": params.get("alpn", ""),
-                "allow_insecure": params.get("allowInsecure", "false") == "true",
+                "sni": get("sni", host),
+                "host": get("host", host),
+                "path": _unquote(get("path", "/")),
+                "transport": get("type", "ws"),
+                "fingerprint": get("fp", ""),
+                "alpn": get("alpn", ""),
+                "allow_insecure": get("allowInsecure", "false") == "true",
             })
         else:
             base.update({
                 "security": security or "none",
-                "sni": params.get("sni", ""),
-                "transport": params.get("type", "tcp"),
-                "fingerprint": params.get("fp", ""),
-                "alpn": params.get("alpn", ""),
-                "host": params.get("host", ""),
-                "path": unquote(params.get("path", "/")),
+                "sni": get("sni", ""),
+                "transport": get("type", "tcp"),
+                "fingerprint": get("fp", ""),
+                "alpn": get("alpn", ""),
+                "host": get("host", ""),
+                "path": _unquote(get("path", "/")),
             })
 
         # Parse fragment param: "length,interval,packets" e.g. "10-20,10-20,tlshello"
-        frag_str = params.get("fragment", "")
+        frag_str = get("fragment", "")
         if frag_str:
             parts = frag_str.split(",")
             if len(parts) == 3:
@@ -144,55 +173,56 @@ def _build_vless(config: dict) -> str:
     uuid = config["uuid"]
     host = config["address"]
     port = config["port"]
-    name = quote(config.get("name", ""), safe="")
+    name = _fast_quote(config.get("name", ""))
     security = config.get("security", "tls")
 
+    # Collect query parts in a list and join once — repeated += on str
+    # reallocates the whole query on every append
     if security == "reality":
-        params = (
-            f"security=reality&encryption=none"
-            f"&pbk={config.get('public_key', '')}"
-            f"&headerType=none"
-            f"&fp={config.get('fingerprint', 'chrome')}"
-            f"&type={config.get('transport', 'tcp')}"
-            f"&flow={config.get('flow', 'xtls-rprx-vision')}"
-            f"&sni={config.get('sni', '')}"
-            f"&sid={config.get('short_id', '')}"
-        )
+        parts = [
+            "security=reality",
+            "encryption=none",
+            f"pbk={config.get('public_key', '')}",
+            "headerType=none",
+            f"fp={config.get('fingerprint', 'chrome')}",
+            f"type={config.get('transport', 'tcp')}",
+            f"flow={config.get('flow', 'xtls-rprx-vision')}",
+            f"sni={config.get('sni', '')}",
+            f"sid={config.get('short_id', '')}",
+        ]
     else:
-        encoded_path = quote(config.get("path", "/"), safe="")
-        params = (
-            f"encryption=none&security=tls&type={config.get('transport', 'ws')}"
-            f"&host={config.get('host', host)}"
-            f"&sni={config.get('sni', host)}"
-            f"&path={encoded_path}"
-        )
+        parts = [
+            "encryption=none",
+            "security=tls",
+            f"type={config.get('transport', 'ws')}",
+            f"host={config.get('host', host)}",
+            f"sni={config.get('sni', host)}",
+            f"path={_fast_quote(config.get('path', '/'))}",
+        ]
         if config.get("fingerprint"):
-            params += f"&fp={config['fingerprint']}"
+            parts.append(f"fp={config['fingerprint']}")
         if config.get("alpn"):
-            params += f"&alpn={config['alpn']}"
+            parts.append(f"alpn={config['alpn']}")
 
     # Fragment: "length,interval,packets"
     if config.get("fragment_length"):
-        frag = (
-            f"{config['fragment_length']},"
+        parts.append(
+            f"fragment={config['fragment_length']},"
             f"{config.get('fragment_interval', '10-20')},"
-            f"{config.get('fragment_packets', 'tlshello')}"
+            f"{config.get('fragment_packets', 'tlshello')}",
         )
-        params += f"&fragment={frag}"
 
-    return f"vless://{uuid}@{host}:{port}?{params}#{name}"
+    return f"vless://{uuid}@{host}:{port}?{'&'.join(parts)}#{name}"
 
 
 # ── VMess ──────────────────────────────────────────────────────────────────
 
-def _parse_vmess(uri: str) -> dict | None:
+def _parse_vmess(encoded: str) -> dict | None:
     try:
-        encoded = uri[len("vmess://"):]
         # Strip fragment if present after base64
-        if "#" in encoded:
-            encoded = encoded.split("#")[0]
-        decoded = _b64_decode(encoded)
-        obj = json.loads(decoded)
+        encoded, _, _ = encoded.partition("#")
+        # orjson parses the decoded bytes directly — no intermediate str
+        obj = orjson.loads(_b64_decode_bytes(encoded))
 
         return {
             "protocol": "vmess",
@@ -238,17 +268,14 @@ def _build_vmess(config: dict) -> str:
 
 # ── Trojan ─────────────────────────────────────────────────────────────────
 
-def _parse_trojan(uri: str) -> dict | None:
+def _parse_trojan(without_scheme: str) -> dict | None:
     try:
-        without_scheme = uri[len("trojan://"):]
-        fragment = ""
-        if "#" in without_scheme:
-            without_scheme, fragment = without_scheme.rsplit("#", 1)
-            fragment = unquote(fragment)
+        without_scheme, _, fragment = without_scheme.partition("#")
+        fragment = _unquote(fragment) if fragment else ""
 
         user_host, _, query_str = without_scheme.partition("?")
         password, _, host_port = user_host.partition("@")
-        password = unquote(password)
+        password = _unquote(password)
         host, _, port_str = host_port.rpartition(":")
         port = int(port_str)
 
@@ -262,7 +289,7 @@ def _parse_trojan(uri: str) -> dict | None:
             "sni": params.get("sni", host),
             "transport": params.get("type", "tcp"),
             "host": params.get("host", ""),
-            "path": unquote(params.get("path", "")),
+            "path": _unquote(params.get("path", "")),
             "tls": params.get("security", "tls"),
             "fingerprint": params.get("fp", ""),
             "alpn": params.get("alpn", ""),
@@ -273,10 +300,10 @@ def _parse_trojan(uri: str) -> dict | None:
 
 
 def _build_trojan(config: dict) -> str:
-    password = quote(config["password"], safe="")
+    password = _fast_quote(config["password"])
     host = config["address"]
     port = config["port"]
-    name = quote(config.get("name", ""), safe="")
+    name = _fast_quote(config.get("name", ""))
 
     parts = []
     if config.get("sni"):
@@ -286,7 +313,7 @@ def _build_trojan(config: dict) -> str:
     if config.get("host"):
         parts.append(f"host={config['host']}")
     if config.get("path"):
-        parts.append(f"path={quote(config['path'], safe='')}")
+        parts.append(f"path={_fast_quote(config['path'])}")
     if config.get("tls", "tls") != "tls":
         parts.append(f"security={config['tls']}")
     if config.get("fingerprint"):
@@ -300,13 +327,10 @@ def _build_trojan(config: dict) -> str:
 
 # ── Shadowsocks ────────────────────────────────────────────────────────────
 
-def _parse_shadowsocks(uri: str) -> dict | None:
+def _parse_shadowsocks(without_scheme: str) -> dict | None:
     try:
-        without_scheme = uri[len("ss://"):]
-        fragment = ""
-        if "#" in without_scheme:
-            without_scheme, fragment = without_scheme.rsplit("#", 1)
-            fragment = unquote(fragment)
+        without_scheme, _, fragment = without_scheme.partition("#")
+        fragment = _unquote(fragment) if fragment else ""
 
         if "@" in without_scheme:
             # SIP002: ss://base64(method:password)@host:port#name
@@ -314,7 +338,7 @@ def _parse_shadowsocks(uri: str) -> dict | None:
             host, _, port_str = host_port.rpartition(":")
             port = int(port_str)
 
-            decoded = _b64_decode(unquote(user_info))
+            decoded = _b64_decode(_unquote(user_info))
             method, _, password = decoded.partition(":")
         else:
             # Legacy: ss://base64(method:password@host:port)#name
@@ -341,35 +365,79 @@ def _build_shadowsocks(config: dict) -> str:
     encoded = base64.b64encode(user_info.encode()).decode().rstrip("=")
     host = config["address"]
     port = config["port"]
-    name = quote(config.get("name", ""), safe="")
+    name = _fast_quote(config.get("name", ""))
     return f"ss://{encoded}@{host}:{port}#{name}"
 
 
+# Scheme → parser dispatch; handlers receive the URI with scheme stripped
+_PARSERS: dict[str, Callable[[str], dict | None]] = {
+    "vless": _parse_vless,
+    "vmess": _parse_vmess,
+    "trojan": _parse_trojan,
+    "ss": _parse_shadowsocks,
+}
+
+
 # ── Helpers ────────────────────────────────────────────────────────────────
 
+_SAFE_CHARS = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+)
+
+
+def _fast_quote(s: str) -> str:
+    """quote(safe="") with a fast path for strings needing no escapes —
+    empty names and hex-ish passwords are the common case."""
+    return s if all(c in _SAFE_CHARS for c in s) else quote(s, safe="")
+
+
+def _unquote(s: str) -> str:
+    """unquote with a fast path for strings without percent-escapes —
+    the common case for paths like "/" and plain node names."""
+    return _unquote_slow(s) if "%" in s else s
+
+
+@functools.lru_cache(maxsize=1024)
+def _unquote_slow(s: str) -> str:
+    # Node names and paths repeat across rescans — cache the decoded form
+    return unquote(s)
+
+
 def _parse_query(query: str) -> dict[str, str]:
     """Parse query string into a flat dict."""
-    params = {}
     if not query:
-        return params
-    for param in query.split("&"):
-        eq_idx = param.find("=")
-        if eq_idx > 0:
-            key = param[:eq_idx]
-            value = param[eq_idx + 1:]
-            params[key] = value
-    return params
+        return {}
+    # Generator into dict() keeps the split loop in C instead of
+    # per-param bytecode
+    return dict(
+        item.split("=", 1) for item in query.split("&") if "=" in item
+    )
+
+
+def _b64_decode_bytes(s: str) -> bytes:
+    """Base64 decode to raw bytes with computed padding.
+
+    Padding is derived arithmetically and the alphabet picked by whether
+    urlsafe characters are present, so the happy path is one decode call
+    instead of a try/except ladder over padding candidates.
+    """
+    original = s
+    s = s.strip().rstrip("=")
+    s += "=" * (-len(s) % 4)
+    decoder = (
+        base64.urlsafe_b64decode if "-" in s or "_" in s else base64.b64decode
+    )
+    try:
+        return decoder(s)
+    except Exception:
+        # Plain text (AEAD-2022 format) — fall back to the input as given,
+        # not the padded copy, or plain passwords grow trailing "="
+        return _unquote(original).encode()
 
 
 def _b64_decode(s: str) -> str:
-    """Try multiple base64 decode strategies."""
-    s = s.strip()
-    # Add padding if needed
-    for candidate in [s, s + "=", s + "==", s + "==="]:
-        for decode_fn in [base64.urlsafe_b64decode, base64.b64decode]:
-            try:
-                return decode_fn(candidate).decode("utf-8")
-            except Exception:
-                continue
-    # Try as plain text (AEAD-2022 format)
-    return unquote(s)
+    """String variant of _b64_decode_bytes, percent-decoding on failure."""
+    try:
+        return _b64_decode_bytes(s).decode("utf-8")
+    except UnicodeDecodeError:
+        return _unquote(s)
@@ -112,27 +112,21 @@ def ask_config_input() -> list[dict]:
         )
 
 
-def ask_params() -> list[str]:
-    """Ask which parameter groups to test."""
-    result = questionary.checkbox(
-        "Which parameters do you want to test? (space to select)",
-        choices=PARAM_CHOICES,
-        style=STYLE,
-    ).ask()
-
-    if not result:
-        console.print("  [yellow]No params selected, using recommended defaults.[/yellow]")
-        return ["fragment_length", "fragment_interval", "fragment_packets",
-                "fingerprint", "alpn"]
-
-    return result
-
-
-def ask_search_mode() -> str:
-    """Ask for search mode."""
-    return questionary.select(
-        "Search mode:",
-        choices=[
+# Question specs for the scan wizard — run as one unsafe_prompt batch so
+# a single prompt_toolkit Application serves all of them instead of a
+# fresh event loop per .ask()
+_SCAN_QUESTIONS = [
+    {
+        "type": "checkbox",
+        "name": "params",
+        "message": "Which parameters do you want to test? (space to select)",
+        "choices": PARAM_CHOICES,
+    },
+    {
+        "type": "select",
+        "name": "mode",
+        "message": "Search mode:",
+        "choices": [
             questionary.Choice(
                 "Smart (recommended) — Test each param alone, combine winners",
                 value="smart",
@@ -146,64 +140,71 @@ def ask_search_mode() -> str:
                 value="quick",
             ),
         ],
-        style=STYLE,
-    ).ask()
-
-
-def ask_concurrency() -> int:
-    """Ask for parallel test count."""
-    answer = questionary.select(
-        "Parallel tests (how many simultaneous):",
-        choices=[
+    },
+    {
+        "type": "select",
+        "name": "concurrency",
+        "message": "Parallel tests (how many simultaneous):",
+        "choices": [
             questionary.Choice("10 (recommended for most connections)", value="10"),
             questionary.Choice("5  (slower connection / limited resources)", value="5"),
             questionary.Choice("20 (fast connection / powerful machine)", value="20"),
         ],
-        style=STYLE,
-    ).ask()
-    return int(answer) if answer else 10
-
-
-def ask_measure_speed() -> bool:
-    """Ask if speed should be measured (slower but more info)."""
-    return questionary.confirm(
-        "Measure download speed? (slower but gives throughput data)",
-        default=False,
-        style=STYLE,
-    ).ask()
-
-
-def ask_clean_ip_options() -> dict:
-    """Ask clean IP scan options."""
-    subnets = questionary.text(
-        "Path to subnets file (leave empty for default Cloudflare ranges):",
-        style=STYLE,
-    ).ask()
+    },
+    {
+        "type": "confirm",
+        "name": "measure_speed",
+        "message": "Measure download speed? (slower but gives throughput data)",
+        "default": False,
+    },
+]
 
-    concurrency = questionary.select(
-        "Parallel connections:",
-        choices=[
+_CLEAN_IP_QUESTIONS = [
+    {
+        "type": "text",
+        "name": "subnets",
+        "message": "Path to subnets file (leave empty for default Cloudflare ranges):",
+    },
+    {
+        "type": "select",
+        "name": "concurrency",
+        "message": "Parallel connections:",
+        "choices": [
             questionary.Choice("20 (recommended)", value="20"),
             questionary.Choice("10 (conservative / avoid rate limits)", value="10"),
             questionary.Choice("50 (fast, may trigger rate limits)", value="50"),
         ],
-        style=STYLE,
-    ).ask()
-
-    sample = questionary.select(
-        "IPs per subnet to test:",
-        choices=[
+    },
+    {
+        "type": "select",
+        "name": "sample",
+        "message": "IPs per subnet to test:",
+        "choices": [
             questionary.Choice("100 (quick sample)", value="100"),
             questionary.Choice("500 (thorough)", value="500"),
             questionary.Choice("All (complete scan, slow)", value="0"),
         ],
-        style=STYLE,
-    ).ask()
+    },
+]
+
+
+def _prompt_batch(questions: list[dict]) -> dict:
+    """Run a batch of questions in one prompt application; exit on Ctrl-C."""
+    try:
+        return questionary.unsafe_prompt(questions, style=STYLE)
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+def ask_clean_ip_options() -> dict:
+    """Ask clean IP scan options."""
+    answers = _prompt_batch(_CLEAN_IP_QUESTIONS)
+    subnets = answers.get("subnets", "")
 
     return {
         "subnets_file": subnets.strip() if subnets and subnets.strip() else None,
-        "concurrency": int(concurrency),
-        "sample_per_subnet": int(sample),
+        "concurrency": int(answers["concurrency"]),
+        "sample_per_subnet": int(answers["sample"]),
     }
 
 
@@ -229,18 +230,21 @@ def ask_post_scan() -> str:
 def run_scan_wizard() -> dict:
     """Run the full scan wizard flow and return options dict."""
     configs = ask_config_input()
-    params = ask_params()
-    mode = ask_search_mode()
-    concurrency = ask_concurrency()
-    measure_speed = ask_measure_speed()
+    answers = _prompt_batch(_SCAN_QUESTIONS)
+
+    params = answers["params"]
+    if not params:
+        console.print("  [yellow]No params selected, using recommended defaults.[/yellow]")
+        params = ["fragment_length", "fragment_interval", "fragment_packets",
+                  "fingerprint", "alpn"]
 
     return {
         "action": "scan",
         "configs": configs,
         "params": params,
-        "mode": mode,
-        "concurrency": concurrency,
-        "measure_speed": measure_speed,
+        "mode": answers["mode"],
+        "concurrency": int(answers["concurrency"]),
+        "measure_speed": answers["measure_speed"],
     }
 
 
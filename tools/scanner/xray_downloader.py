@@ -7,18 +7,15 @@ Search order:
 4. Download from GitHub releases (fallback, needs internet)
 """
 
+import hashlib
+import json
 import os
 import platform
 import shutil
 import stat
-import subprocess
 import sys
-import tempfile
-import zipfile
 from pathlib import Path
 
-import urllib.request
-
 GITHUB_RELEASE_URL = (
     "https://github.com/XTLS/Xray-core/releases/latest/download"
 )
@@ -63,29 +60,114 @@ def _find_in_path() -> str | None:
     return shutil.which("xray")
 
 
+def _is_executable_file(path: Path) -> bool:
+    """is_file() + X_OK check from a single stat() call."""
+    try:
+        st = path.stat()
+    except OSError:
+        return False
+    return stat.S_ISREG(st.st_mode) and bool(st.st_mode & 0o111)
+
+
 def _find_local() -> str | None:
     """Check if xray exists in ./bin/."""
     local = BIN_DIR / "xray"
-    if local.is_file() and os.access(local, os.X_OK):
+    if _is_executable_file(local):
         return str(local)
     return None
 
 
+def _read_meta(target_dir: Path) -> dict:
+    """Read the download metadata (ETag + checksum) saved by _download."""
+    try:
+        with open(target_dir / ".xray.meta") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(target_dir: Path, meta: dict) -> None:
+    try:
+        with open(target_dir / ".xray.meta", "w") as f:
+            json.dump(meta, f)
+    except OSError:
+        pass  # Metadata is an optimization only — never fail the install
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _SeekableMmap:
+    """mmap with a seekable() method — zipfile requires one, and mmap
+    only grew it in Python 3.13."""
+
+    def __init__(self, mm):
+        self._mm = mm
+
+    def seekable(self):
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self._mm, name)
+
+
 def _download(platform_str: str, target_dir: Path) -> str:
-    """Download xray-core from GitHub releases."""
+    """Download xray-core from GitHub releases.
+
+    Sends If-None-Match with the ETag from the previous download; a 304
+    means the release is unchanged and the existing binary (verified
+    against its recorded SHA256) is reused without re-downloading ~30MB.
+    """
+    # Deferred imports: the download path is the cold fallback — don't pay
+    # for these on every start when xray is already present
+    import mmap
+    import tempfile
+    import urllib.error
+    import urllib.request
+    import zipfile
+
     filename = f"Xray-{platform_str}.zip"
     url = f"{GITHUB_RELEASE_URL}/{filename}"
 
     target_dir.mkdir(parents=True, exist_ok=True)
     target_path = target_dir / "xray"
 
+    meta = _read_meta(target_dir)
+    headers = {}
+    if meta.get("etag") and target_path.is_file():
+        headers["If-None-Match"] = meta["etag"]
+
     with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as tmp:
         tmp_path = tmp.name
 
     try:
-        urllib.request.urlretrieve(url, tmp_path)
-
-        with zipfile.ZipFile(tmp_path, "r") as zf:
+        req = urllib.request.Request(url, headers=headers)
+        try:
+            resp = urllib.request.urlopen(req)
+        except urllib.error.HTTPError as e:
+            if e.code != 304:
+                raise
+            if _sha256(target_path) == meta.get("sha256"):
+                return str(target_path)
+            # 304 but the on-disk binary is corrupt/truncated — refetch
+            # unconditionally instead of failing the install
+            resp = urllib.request.urlopen(urllib.request.Request(url))
+
+        # Stream the zip to disk in 1MB chunks — never hold it in memory
+        with resp, open(tmp_path, "wb") as tmp_f:
+            etag = resp.headers.get("ETag", "")
+            shutil.copyfileobj(resp, tmp_f, 1 << 20)
+
+        # mmap the archive so zlib reads pages straight from the page
+        # cache instead of going through per-chunk read() syscalls
+        with open(tmp_path, "rb") as zip_f, \
+                mmap.mmap(zip_f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                zipfile.ZipFile(_SeekableMmap(mm)) as zf:
             # Find the xray binary inside the zip
             xray_name = None
             for name in zf.namelist():
@@ -99,11 +181,16 @@ def _download(platform_str: str, target_dir: Path) -> str:
                     f"Contents: {zf.namelist()}"
                 )
 
+            # Stream the ~30MB binary out of the archive chunk by chunk
             with zf.open(xray_name) as src, open(target_path, "wb") as dst:
-                dst.write(src.read())
+                shutil.copyfileobj(src, dst, 1 << 20)
 
         # Make executable
         target_path.chmod(target_path.stat().st_mode | stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
+        _write_meta(target_dir, {
+            "etag": etag,
+            "sha256": _sha256(target_path),
+        })
         return str(target_path)
     finally:
         try:
@@ -117,7 +204,7 @@ def _find_bundled() -> str | None:
     if not (getattr(sys, "frozen", False) and hasattr(sys, "_MEIPASS")):
         return None
     bundled = Path(sys._MEIPASS) / "xray"
-    if bundled.is_file() and os.access(bundled, os.X_OK):
+    if _is_executable_file(bundled):
         return str(bundled)
     return None
 